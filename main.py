@@ -1,11 +1,17 @@
 #!/usr/bin/env python3
 import os
 import sys
+import gzip
 import json
 import subprocess
 import argparse
+import shutil
+import tempfile
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import logging
 
 # Set up logging
@@ -15,156 +21,237 @@ logging.basicConfig(
 )
 logger = logging.getLogger("go-build-mcp")
 
+# Bound captured subprocess output so runaway programs can't exhaust memory
+MAX_OUTPUT_LINES = 10_000
+
+# Largest request body we accept; the expected payload is a tiny JSON
+# object, so anything bigger is rejected before being allocated
+MAX_BODY = 1 << 16
+
+# Resolve the go binary once instead of paying a PATH search per exec
+_GO = shutil.which("go") or "go"
+if _GO == "go":
+    logger.warning("Could not find 'go' on PATH at startup; builds may fail")
+
+# Prefer orjson for response encoding when available: it returns bytes
+# directly and is much faster on the multi-MB build logs we can emit
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:
+    def _dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+def _do_build(directory_path):
+    """Build and run the Go application in directory_path.
+
+    Module-level so it can be shipped to a worker process; the forkserver
+    workers carry none of the HTTP server's heap or sockets, keeping each
+    build spawn cheap.
+    """
+    # Build to a known temporary name so we never have to guess which
+    # file in the directory is the fresh binary
+    tmp_bin = tempfile.NamedTemporaryFile(
+        delete=False, dir=directory_path, prefix=".mcpbuild_", suffix=""
+    ).name
+    os.unlink(tmp_bin)
+
+    try:
+        # Run go build (cwd= keeps this thread-safe, unlike os.chdir)
+        logger.info(f"Running: go build -o {tmp_bin} .")
+        returncode, build_output = _stream_output(
+            [_GO, "build", "-o", tmp_bin, "."], directory_path
+        )
+
+        # Check if build was successful
+        if returncode != 0:
+            return {
+                "buildSuccess": False,
+                "output": build_output
+            }
+
+        # Run the binary
+        logger.info(f"Running binary: {tmp_bin}")
+        _, output = _stream_output([tmp_bin], directory_path)
+
+        return {
+            "buildSuccess": True,
+            "output": output
+        }
+    finally:
+        # Always remove the temporary binary
+        try:
+            os.unlink(tmp_bin)
+        except FileNotFoundError:
+            pass
+
+def _stream_output(cmd, cwd):
+    """Run cmd, streaming merged stdout/stderr into a bounded line buffer.
+
+    Unlike capture_output=True this never holds more than MAX_OUTPUT_LINES
+    lines in memory, no matter how chatty the subprocess is.
+    """
+    process = subprocess.Popen(
+        cmd,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True
+    )
+    lines = deque(maxlen=MAX_OUTPUT_LINES)
+    for line in process.stdout:
+        lines.append(line)
+    process.wait()
+    return process.returncode, "".join(lines)
+
+class PooledHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer backed by a bounded thread pool.
+
+    An unbounded thread-per-request server would happily spawn a go build
+    per connection and thrash the machine under load; the pool caps how
+    many requests are serviced at once.
+    """
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, max_workers):
+        super().__init__(server_address, handler_class)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self.process_request_thread, request, client_address)
+
+    def shutdown_workers(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
 class GoBuildHandler(BaseHTTPRequestHandler):
-    def _set_headers(self, content_type="application/json"):
-        self.send_response(200)
-        self.send_header("Content-Type", content_type)
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.send_header("Access-Control-Allow-Methods", "POST, OPTIONS")
-        self.send_header("Access-Control-Allow-Headers", "Content-Type")
-        self.end_headers()
+    # Speak HTTP/1.1 so polling clients can reuse the connection instead
+    # of paying a TCP handshake per status check
+    protocol_version = "HTTP/1.1"
+
+    # Worker pool for builds; set by MCPServer.run
+    build_pool = None
+
+    # The status line and CORS headers never change, so they're encoded
+    # once at class-definition time instead of being formatted and written
+    # header-by-header on every response
+    _HEADER_BLOB = (
+        b"HTTP/1.1 200 OK\r\n"
+        b"Content-Type: application/json\r\n"
+        b"Access-Control-Allow-Origin: *\r\n"
+        b"Access-Control-Allow-Methods: POST, OPTIONS\r\n"
+        b"Access-Control-Allow-Headers: Content-Type\r\n"
+        b"Connection: keep-alive\r\n"
+    )
+
+    def _set_headers(self, content_length=None):
+        parts = [self._HEADER_BLOB]
+        if content_length is not None:
+            parts.append(b"Content-Length: %d\r\n" % content_length)
+        parts.append(b"\r\n")
+        # One buffered write -> one send() per response instead of five
+        self.wfile.write(b"".join(parts))
+        self.log_request(200)
+
+    def _send_json(self, payload):
+        # Encode once so we can advertise Content-Length up front
+        body = _dumps(payload)
+        encoding_header = b""
+        # Build logs compress extremely well; level 1 gets most of the
+        # ratio at a fraction of the CPU of the default level
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel=1)
+            encoding_header = b"Content-Encoding: gzip\r\n"
+        self.wfile.write(b"".join([
+            self._HEADER_BLOB,
+            encoding_header,
+            b"Content-Length: %d\r\n\r\n" % len(body),
+            body,
+        ]))
+        self.log_request(200)
 
     def do_OPTIONS(self):
-        self._set_headers()
-        
+        self._set_headers(content_length=0)
+
     def do_POST(self):
         content_length = int(self.headers.get("Content-Length", 0))
         if content_length <= 0:
-            self._set_headers()
-            self.wfile.write(json.dumps({"error": "Empty request"}).encode())
+            self._send_json({"error": "Empty request"})
+            return
+        if content_length > MAX_BODY:
+            self.send_error(413)
             return
 
-        # Parse the request body
-        request_body = self.rfile.read(content_length).decode("utf-8")
+        # Parse the request body; json.loads takes bytes directly, so no
+        # intermediate str copy of the body is needed
+        request_body = self.rfile.read(content_length)
         try:
             request_data = json.loads(request_body)
         except json.JSONDecodeError:
-            self._set_headers()
-            self.wfile.write(json.dumps({"error": "Invalid JSON"}).encode())
+            self._send_json({"error": "Invalid JSON"})
             return
 
         # Get the directory path from the request
         directory_path = request_data.get("path")
         if not directory_path:
-            self._set_headers()
-            self.wfile.write(json.dumps({"error": "Missing 'path' parameter"}).encode())
+            self._send_json({"error": "Missing 'path' parameter"})
             return
 
         # Ensure the directory exists
         if not os.path.isdir(directory_path):
-            self._set_headers()
-            self.wfile.write(json.dumps({
+            self._send_json({
                 "buildSuccess": False,
                 "output": f"Directory does not exist: {directory_path}"
-            }).encode())
+            })
             return
 
+        # Normalize to an absolute path so nothing downstream depends on
+        # the server process's own working directory
+        directory_path = os.path.abspath(directory_path)
+
         # Try to build the Go application
         logger.info(f"Building Go project in: {directory_path}")
         result = self._build_and_run(directory_path)
-        
+
         # Send response
-        self._set_headers()
-        self.wfile.write(json.dumps(result).encode())
+        self._send_json(result)
 
     def _build_and_run(self, directory_path):
         """Build and run the Go application in the specified directory"""
-        # Store current directory so we can return to it
-        original_dir = os.getcwd()
-        
-        try:
-            # Log the directory we're changing to
-            logger.info(f"Changing to directory: {directory_path}")
-            os.chdir(directory_path)
-            
-            # Verify we're in the right directory
-            current_dir = os.getcwd()
-            logger.info(f"Current working directory: {current_dir}")
-            
-            if not os.path.samefile(current_dir, directory_path):
-                return {
-                    "buildSuccess": False,
-                    "output": f"Failed to change to correct directory. Expected: {directory_path}, Actual: {current_dir}"
-                }
-            
-            # Run go build
-            logger.info("Running: go build .")
-            build_process = subprocess.run(
-                ["go", "build", "."],
-                capture_output=True,
-                text=True
-            )
-            
-            # Check if build was successful
-            if build_process.returncode != 0:
-                return {
-                    "buildSuccess": False,
-                    "output": build_process.stderr
-                }
-            
-            # Find the binary (the one that was just created)
-            binary_name = None
-            
-            # First try to determine binary name from directory name (common convention)
-            dir_binary = os.path.basename(os.path.normpath(directory_path))
-            if os.path.isfile(dir_binary) and os.access(dir_binary, os.X_OK):
-                binary_name = dir_binary
-                logger.info(f"Found binary based on directory name: {binary_name}")
-            
-            # If that fails, look for executables
-            if binary_name is None:
-                logger.info("Searching for executable files in directory")
-                go_mod_time = 0
-                if os.path.exists("go.mod"):
-                    go_mod_time = os.path.getmtime("go.mod")
-                    
-                for file in os.listdir("."):
-                    file_path = os.path.join(".", file)
-                    if os.path.isfile(file_path) and os.access(file_path, os.X_OK):
-                        # Check if this is a recently created/modified file (likely our binary)
-                        if go_mod_time == 0 or os.path.getmtime(file_path) > go_mod_time:
-                            binary_name = file
-                            logger.info(f"Found binary by executable check: {binary_name}")
-                            break
-            
-            if not binary_name:
-                return {
-                    "buildSuccess": True,
-                    "output": "Build successful, but couldn't find the binary to execute."
-                }
-            
-            # Run the binary
-            logger.info(f"Running binary: {binary_name}")
-            run_process = subprocess.run(
-                [f"./{binary_name}"],
-                capture_output=True,
-                text=True
-            )
-            
-            # Combine stdout and stderr
-            output = run_process.stdout
-            if run_process.stderr:
-                output += "\n" + run_process.stderr
-            
-            return {
-                "buildSuccess": True,
-                "output": output
-            }
-        finally:
-            # Always return to the original directory
-            logger.info(f"Returning to original directory: {original_dir}")
-            os.chdir(original_dir)
+        if self.build_pool is not None:
+            # The pool's worker count is the build-concurrency bound
+            return self.build_pool.submit(_do_build, directory_path).result()
+        return _do_build(directory_path)
 
 # Create a proper class-based server object that Claude Desktop can detect
 class MCPServer:
     def __init__(self):
         self.handler = GoBuildHandler
     
-    def run(self, port=8080):
+    def run(self, port=8080, max_build_concurrency=None):
+        if max_build_concurrency is None:
+            max_build_concurrency = os.cpu_count() or 4
+        # forkserver workers start from a minimal template process instead
+        # of forking the full server heap (and its sockets) per build
+        self.handler.build_pool = ProcessPoolExecutor(
+            max_workers=max_build_concurrency,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
         server_address = ("", port)
-        httpd = HTTPServer(server_address, self.handler)
-        logger.info(f"Starting Go Build MCP server on port {port}")
-        httpd.serve_forever()
+        httpd = PooledHTTPServer(server_address, self.handler, max_build_concurrency)
+        logger.info(f"Starting Go Build MCP server on port {port} "
+                    f"(max build concurrency: {max_build_concurrency})")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            # Executor threads are non-daemon and an in-flight request
+            # blocks on its build future with no timeout, so a normal exit
+            # would hang joining them; drop queued work and leave without
+            # waiting for stragglers
+            logger.info("Interrupt received, shutting down")
+            self.handler.build_pool.shutdown(wait=False, cancel_futures=True)
+            httpd.shutdown_workers()
+            httpd.server_close()
+            os._exit(0)
 
 # Create the standard server object that Claude Desktop will look for
 mcp = MCPServer()
@@ -174,10 +261,12 @@ server = mcp  # Alternative name
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="MCP server for building and running Go applications")
     parser.add_argument("--port", type=int, default=8080, help="Port to run the server on")
+    parser.add_argument("--max-build-concurrency", type=int, default=os.cpu_count(),
+                        help="Maximum number of concurrent go build subprocesses")
     args = parser.parse_args()
-    
+
     try:
-        mcp.run(args.port)
+        mcp.run(args.port, args.max_build_concurrency)
     except KeyboardInterrupt:
         logger.info("Server stopped")
         sys.exit(0)
\ No newline at end of file
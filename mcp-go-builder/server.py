@@ -4,163 +4,469 @@ FastMCP Desktop Example
 A simple example that exposes the desktop directory as a resource.
 """
 
+import asyncio
+import functools
+import hashlib
+import io
+import json
+import os
+import shlex
+import shutil
+import signal
+import stat
+import time
+from collections import deque
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
 from mcp.server.fastmcp import FastMCP
 
+
 # Create server
 mcp = FastMCP("go-builder")
 
+# Bound captured subprocess output so runaway programs can't exhaust memory
+MAX_OUTPUT_LINES = 10_000
+
+# Resolve the go binary once instead of paying a PATH search per exec
+_GO = shutil.which("go") or "go"
+
+# How long to wait for residual output after the process is gone before
+# giving up on pipes held open by a leftover background child
+_DRAIN_TIMEOUT = 0.25
+
+
+def _go_env():
+    """Environment for go subprocesses.
+
+    Pins the build and module caches to stable locations — so repeat MCP
+    invocations actually hit them even if the caller's env is odd — and
+    lets the compiler use every core.
+    """
+    ncpu = os.cpu_count() or 4
+    env = os.environ.copy()
+    env.setdefault("GOCACHE", str(Path.home() / ".cache" / "go-build"))
+    env.setdefault("GOMODCACHE", str(Path.home() / "go" / "pkg" / "mod"))
+    env["GOMAXPROCS"] = str(ncpu)
+    env["GOFLAGS"] = (f"-p={ncpu} " + env.get("GOFLAGS", "")).strip()
+    return env
+
+
+_GO_ENV = _go_env()
+
+
+async def _stream_lines(stream, lines):
+    """Drain one subprocess stream line-by-line into a bounded buffer.
+
+    Keeps at most the last MAX_OUTPUT_LINES lines instead of buffering the
+    whole output in one communicate() string.
+    """
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        lines.append(line.decode(errors="replace").rstrip())
+
+
+_IS_WINDOWS = os.name == "nt"
+
+
+def _find_executables_windows(project_path, newer_than=None):
+    """Yield .exe files in project_path, optionally only ones modified
+    at or after newer_than (seconds since the epoch)."""
+    with os.scandir(project_path) as it:
+        for entry in it:
+            if entry.name.lower().endswith(".exe") and entry.is_file(
+                follow_symlinks=False
+            ):
+                if (
+                    newer_than is not None
+                    and entry.stat(follow_symlinks=False).st_mtime < newer_than
+                ):
+                    continue
+                yield Path(entry.path)
+
+
+def _find_executables_unix(project_path, newer_than=None):
+    """Yield non-.go regular files in project_path with an execute bit set.
+
+    One cached stat per entry answers both the regular-file and the
+    executability question, where a Path.iterdir() + os.access() loop pays
+    two or three syscalls for the same information. newer_than, when given,
+    filters out files last modified before that epoch timestamp.
+    """
+    with os.scandir(project_path) as it:
+        for entry in it:
+            if entry.name.endswith(".go"):
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode) and st.st_mode & 0o111:
+                if newer_than is not None and st.st_mtime < newer_than:
+                    continue
+                yield Path(entry.path)
+
+
+# Resolve the platform branch once at import time rather than on every call
+_find_executables = _find_executables_windows if _IS_WINDOWS else _find_executables_unix
+
+
+# Directories whose contents don't feed the build; skipped outright
+_SKIP_DIRS = frozenset({".git", "node_modules", "vendor"})
+
+
+def _scan_go_sources(root):
+    """Digest of every .go file under root, or None if there are none.
+
+    An explicit scandir stack walk: DirEntry.stat() reuses the data fetched
+    with the directory listing, so no extra stat syscall per source file,
+    and VCS/dependency directories are pruned instead of being descended.
+    Each file contributes its path, mtime and size, so deleting a source
+    file — or adding one with an old timestamp — changes the digest; a
+    newest-mtime summary would miss both.
+    """
+    entries = []
+    stack = [os.fspath(root)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in _SKIP_DIRS:
+                        stack.append(entry.path)
+                elif entry.name.endswith(".go"):
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    entries.append(f"{entry.path}|{st.st_mtime_ns}|{st.st_size}")
+    if not entries:
+        return None
+    # scandir order is filesystem-dependent; sort so the digest is stable
+    entries.sort()
+    key = hashlib.blake2b(digest_size=16)
+    for line in entries:
+        key.update(line.encode())
+    return key.hexdigest()
+
+
+def _stat_mtime_ns(path):
+    """mtime of path in nanoseconds, or 0 if it doesn't exist."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+async def _kill_process_tree(pid):
+    """Kill pid and all of its descendants; returns an error string or None.
+
+    Processes are spawned in their own session, so a single killpg reaches
+    every descendant — no /proc walk over the process tree required.
+    """
+    try:
+        pgid = os.getpgid(pid)
+        os.killpg(pgid, signal.SIGTERM)
+        # Give the group a moment to exit cleanly before the hard kill
+        await asyncio.sleep(0.2)
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        return None
+
+    except ProcessLookupError:
+        # Already gone
+        return None
+    except Exception as e:
+        # Fallback: try direct kill of the parent alone
+        try:
+            os.kill(pid, signal.SIGKILL if not _IS_WINDOWS else signal.SIGTERM)
+        except:
+            pass
+        return f"Error killing process tree: {str(e)}"
+
+
+@functools.lru_cache(maxsize=256)
+def _resolve_dir(project_dir: str) -> Path:
+    """Resolve a project directory string to an absolute Path, cached.
+
+    MCP clients call the tools with the same directory over and over, so
+    the symlink-chasing resolve() only has to happen once per directory.
+    """
+    return Path(project_dir).resolve()
+
+
+@functools.lru_cache(maxsize=128)
+def _parse_args(args: str) -> tuple:
+    """shlex-split an argument string into a tuple, cached per string."""
+    return tuple(shlex.split(args)) if args else ()
+
+
+@functools.lru_cache(maxsize=64)
+def _build_fingerprint(project_dir, gomod_mtime, gosum_mtime, source_digest):
+    """Cache slot for one build-input fingerprint.
+
+    lru_cache hands back the same dict whenever the same stat fingerprint
+    recurs, so a previous successful build can be replayed without spawning
+    go at all; any input change produces a fresh, empty slot.
+    """
+    return {}
+
+
+# On-disk counterpart to _build_fingerprint: survives server restarts
+_DISK_CACHE_DIR = Path.home() / ".cache" / "go-builder-mcp"
+
+
+def _disk_cache_path(project_dir, gomod_mtime, gosum_mtime, source_digest):
+    """Cache-file path for one build-input fingerprint.
+
+    The key hashes the per-file source digest (every .go path, mtime and
+    size) plus the actual go.mod/go.sum bytes, so source additions,
+    deletions and dependency edits all invalidate the entry — even if a
+    tool rewrites the module files with preserved timestamps. blake2b is
+    the fastest hash in hashlib for this.
+    """
+    key = hashlib.blake2b(digest_size=16)
+    key.update(
+        f"{project_dir}|{gomod_mtime}|{gosum_mtime}|{source_digest}".encode()
+    )
+    for name in ("go.mod", "go.sum"):
+        try:
+            with open(os.path.join(project_dir, name), "rb") as f:
+                key.update(f.read())
+        except OSError:
+            pass
+    return _DISK_CACHE_DIR / f"{key.hexdigest()}.json"
+
+
+def _disk_cache_load(cache_file):
+    """Return the cached {"output", "exe"} entry, or None if absent/stale."""
+    try:
+        with open(cache_file, "rb") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    exe = entry.get("exe")
+    if exe is not None and not os.path.exists(exe):
+        return None
+    return entry
+
+
+def _disk_cache_store(cache_file, output, exe):
+    """Persist a successful build's output and executable path."""
+    try:
+        _DISK_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(cache_file, "w") as f:
+            json.dump({"output": output, "exe": exe}, f)
+    except OSError:
+        # A broken cache directory should never fail the build itself
+        pass
+
 
 @mcp.tool()
-def build(project_dir: str) -> Tuple[str, bool]:
+async def build(project_dir: str) -> Tuple[str, bool]:
     """Build go Project in project_dir param and reply with success/fail"""
 
-    import subprocess
-    import os
-    from pathlib import Path
+    output_str, success, _ = await _build_impl(project_dir)
+    return output_str, success
+
+
+async def _build_impl(project_dir: str) -> Tuple[str, bool, Optional[str]]:
+    """Shared build logic; also reports the produced executable's path.
+
+    Returning the executable lets run() skip a second directory scan after
+    a fallback build. The MCP tool wrapper keeps the public 2-tuple shape.
+    """
 
-    # Initialize output and status
-    output_lines = []
+    # One growable text buffer instead of a fragment list joined at the end
+    buf = io.StringIO()
+    emit = buf.write
     success = False
+    cache = None
+    cache_file = None
+    exe_path = None
 
     # Validate project directory
-    project_path = Path(project_dir).resolve()
+    project_path = _resolve_dir(project_dir)
     if not project_path.is_dir():
-        return f"Error: Directory '{project_dir}' does not exist", False
+        return f"Error: Directory '{project_dir}' does not exist", False, None
 
     try:
-        # Check for Go files
-        go_files = list(project_path.glob("**/*.go"))
-        if not go_files:
-            return f"Error: No Go source files found in '{project_dir}'", False
+        # Fingerprint the sources in one walk; this doubles as the
+        # "are there any Go files?" check. The walk is the slowest
+        # pre-build step, so it runs on a worker thread — overlapped with
+        # the module-file stats — leaving the event loop free to serve
+        # other tool calls meanwhile
+        project_dir_abs = str(project_path)
+        source_digest, gomod_mtime, gosum_mtime = await asyncio.gather(
+            asyncio.to_thread(_scan_go_sources, project_path),
+            asyncio.to_thread(_stat_mtime_ns, os.path.join(project_dir_abs, "go.mod")),
+            asyncio.to_thread(_stat_mtime_ns, os.path.join(project_dir_abs, "go.sum")),
+        )
+        if source_digest is None:
+            return f"Error: No Go source files found in '{project_dir}'", False, None
+
+        # If nothing changed since the last successful build and its
+        # binary is still there, skip go mod tidy and go build entirely
+        cache = _build_fingerprint(
+            project_dir_abs, gomod_mtime, gosum_mtime, source_digest
+        )
+        cached_exe = cache.get("exe")
+        if cache.get("success") and (cached_exe is None or os.path.exists(cached_exe)):
+            return cache["output"], True, cached_exe
+
+        # The in-process cache is empty after a restart; fall back to the
+        # on-disk cache before resorting to spawning go (file I/O on a
+        # worker thread, like the stat walk above)
+        cache_file = _disk_cache_path(
+            project_dir_abs, gomod_mtime, gosum_mtime, source_digest
+        )
+        disk_entry = await asyncio.to_thread(_disk_cache_load, cache_file)
+        if disk_entry is not None:
+            cache["success"] = True
+            cache["output"] = disk_entry["output"]
+            cache["exe"] = disk_entry.get("exe")
+            return cache["output"], True, cache["exe"]
 
         # Run go build
-        output_lines.append(f"Building Go project in {project_dir}...")
-
-        # Check for go.mod file and handle dependencies if needed
-        go_mod_path = project_path / "go.mod"
-        if go_mod_path.exists():
-            output_lines.append("Found go.mod file, running 'go mod tidy'")
-            tidy_process = subprocess.run(
-                ["go", "mod", "tidy"], cwd=project_dir, capture_output=True, text=True
+        emit(f"Building Go project in {project_dir}...\n")
+
+        # Refresh dependencies only when go.mod is newer than go.sum; a
+        # fresh go.sum means tidy has nothing to resolve, and its module
+        # graph traversal is often the slowest part of a build
+        if gomod_mtime and (gosum_mtime == 0 or gosum_mtime < gomod_mtime):
+            emit("Found go.mod file, running 'go mod tidy'\n")
+            tidy_process = await asyncio.create_subprocess_exec(
+                _GO,
+                "mod",
+                "tidy",
+                cwd=project_dir,
+                env=_GO_ENV,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
             )
+            tidy_lines = deque(maxlen=MAX_OUTPUT_LINES)
+            await _stream_lines(tidy_process.stdout, tidy_lines)
+            await tidy_process.wait()
 
             if tidy_process.returncode != 0:
-                output_lines.append(
-                    f"Warning during 'go mod tidy': {tidy_process.stderr.strip()}"
-                )
-
-        # Run the actual build
-        build_process = subprocess.run(
-            ["go", "build", "-v", "."], cwd=project_dir, capture_output=True, text=True
+                emit(f"Warning during 'go mod tidy': {' '.join(tidy_lines).strip()}\n")
+
+        # Run the actual build, streaming output instead of buffering it all
+        build_start = time.time()
+        build_process = await asyncio.create_subprocess_exec(
+            _GO,
+            "build",
+            "-v",
+            ".",
+            cwd=project_dir,
+            env=_GO_ENV,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
         )
-
-        # Process build output
-        if build_process.stdout:
-            output_lines.append(build_process.stdout.strip())
+        build_lines = deque(maxlen=MAX_OUTPUT_LINES)
+        await _stream_lines(build_process.stdout, build_lines)
+        await build_process.wait()
 
         # Check build status
         if build_process.returncode == 0:
             success = True
-            output_lines.append("Build successful ✓")
+            if build_lines:
+                emit("\n".join(build_lines))
+                emit("\n")
+            emit("Build successful ✓\n")
 
             # Try to identify the executable
             # For Windows, look for .exe files
             # For Unix, look for executable permissions
-            executables = []
-
-            if os.name == "nt":  # Windows
-                for exe in project_path.glob("*.exe"):
-                    if exe.is_file():
-                        executables.append(exe.name)
-            else:  # Unix-like
-                for file in project_path.iterdir():
-                    if (
-                        file.is_file()
-                        and os.access(file, os.X_OK)
-                        and not file.name.endswith(".go")
-                    ):
-                        executables.append(file.name)
+            # Only files touched since the build started can be its output,
+            # so filter on mtime (with 1s of slack for coarse filesystem
+            # timestamps); fall back to a full scan if that finds nothing
+            executables = [
+                exe.name
+                for exe in _find_executables(project_path, newer_than=build_start - 1)
+            ]
+            if not executables:
+                executables = [exe.name for exe in _find_executables(project_path)]
 
             if executables:
-                output_lines.append(f"Executable(s) created: {', '.join(executables)}")
+                emit(f"Executable(s) created: {', '.join(executables)}\n")
             else:
                 # The executable might have been created in the GOPATH/bin directory
-                output_lines.append(
+                emit(
                     "Note: No executables found in the project directory. "
-                    "Check your GOPATH/bin directory if you're using 'go install'."
+                    "Check your GOPATH/bin directory if you're using 'go install'.\n"
                 )
+
+            # Remember the binary so a fingerprint hit can verify it later
+            exe_path = (
+                os.path.join(project_dir_abs, executables[0]) if executables else None
+            )
+            cache["exe"] = exe_path
         else:
             # Build failed
             success = False
-            output_lines.append("Build failed ✗")
-            if build_process.stderr:
-                output_lines.append(f"Error details:\n{build_process.stderr.strip()}")
-
-    except subprocess.SubprocessError as e:
-        output_lines.append(f"Error executing Go build command: {str(e)}")
+            emit("Build failed ✗\n")
+            if build_lines:
+                emit("Error details:\n")
+                emit("\n".join(build_lines))
+                emit("\n")
+
+    except OSError as e:
+        emit(f"Error executing Go build command: {str(e)}\n")
         success = False
     except Exception as e:
-        output_lines.append(f"Unexpected error during build process: {str(e)}")
+        emit(f"Unexpected error during build process: {str(e)}\n")
         success = False
 
-    # Join all output lines into a single string
-    output_str = "\n".join(output_lines)
-    return output_str, success
+    output_str = buf.getvalue().rstrip("\n")
+    if success and cache is not None:
+        cache["success"] = True
+        cache["output"] = output_str
+        if cache_file is not None:
+            await asyncio.to_thread(_disk_cache_store, cache_file, output_str, exe_path)
+    return output_str, success, exe_path
 
 
 @mcp.tool()
-def run(
-    project_dir: str, args: str = "", timeout_seconds: int = 60
+async def run(
+    project_dir: str, args: str = "", timeout_seconds: int = 60, stream: bool = False
 ) -> Tuple[str, bool]:
     """
-    Run a Go executable from the specified project directory for max 5 seconds
+    Run a Go executable from the specified project directory
 
     Args:
         project_dir: Directory containing the Go executable
         args: Command-line arguments to pass to the executable (space-separated)
-        timeout_seconds: Maximum execution time in seconds (not used - always exits after 5 sec)
+        timeout_seconds: Maximum execution time in seconds
+        stream: Accepted for compatibility; output is always read
+            incrementally into bounded buffers so a timeout kill still
+            reports everything the program printed before it died
 
     Returns:
         Tuple containing (output, success)
     """
 
-    import subprocess
-    import os
-    import shlex
-    import time
-    import signal
-    import psutil  # Make sure this is installed
-    from pathlib import Path
-
-    # Initialize output and status
-    output_lines = []
+    # One growable text buffer instead of a fragment list joined at the end
+    buf = io.StringIO()
+    emit = buf.write
     success = False
     process = None
 
     # Validate project directory
-    project_path = Path(project_dir).resolve()
+    project_path = _resolve_dir(project_dir)
     if not project_path.is_dir():
         return f"Error: Directory '{project_dir}' does not exist", False
 
     try:
         # Find the executable
         executable = None
-        executables = []
-
-        if os.name == "nt":  # Windows
-            for exe in project_path.glob("*.exe"):
-                if exe.is_file():
-                    executables.append(exe)
-        else:  # Unix-like
-            for file in project_path.iterdir():
-                if (
-                    file.is_file()
-                    and os.access(file, os.X_OK)
-                    and not file.name.endswith(".go")
-                ):
-                    executables.append(file)
+        executables = list(_find_executables(project_path))
 
         # Handle executable selection (same as before)
         if len(executables) > 1:
@@ -171,238 +477,119 @@ def run(
                     break
             if executable is None:
                 executable = executables[0]
-                output_lines.append(
-                    f"Multiple executables found. Using: {executable.name}"
-                )
+                emit(f"Multiple executables found. Using: {executable.name}\n")
         elif len(executables) == 1:
             executable = executables[0]
 
         # Try building if no executable found
         if executable is None:
-            output_lines.append("No executable found. Attempting to build first...")
-            build_output, build_success = build(project_dir)
-            output_lines.append(build_output)
+            emit("No executable found. Attempting to build first...\n")
+            build_output, build_success, exe_path = await _build_impl(project_dir)
+            emit(build_output)
+            emit("\n")
 
             if not build_success:
-                return "\n".join(output_lines), False
-
-            # Try to find the executable again
-            executables = []
-            if os.name == "nt":  # Windows
-                for exe in project_path.glob("*.exe"):
-                    if exe.is_file():
-                        executables.append(exe)
-            else:  # Unix-like
-                for file in project_path.iterdir():
-                    if (
-                        file.is_file()
-                        and os.access(file, os.X_OK)
-                        and not file.name.endswith(".go")
-                    ):
-                        executables.append(file)
+                return buf.getvalue().rstrip("\n"), False
 
-            if executables:
-                executable = executables[0]
+            if exe_path is not None:
+                # The build already identified its binary; no need to re-scan
+                executable = Path(exe_path)
             else:
                 return (
                     f"Error: Unable to find or build an executable in '{project_dir}'",
                     False,
                 )
 
-        # Prepare command line arguments
-        cmd = [str(executable)]
+        # Prepare command line arguments; the default no-args call skips
+        # the lexer and the join entirely
+        exe_str = os.fspath(executable)
         if args:
-            cmd.extend(shlex.split(args))
-
-        output_lines.append(f"Running: {' '.join(cmd)}")
+            cmd = [exe_str, *_parse_args(args)]
+            emit(f"Running: {' '.join(cmd)}\n")
+        else:
+            cmd = [exe_str]
+            emit(f"Running: {exe_str}\n")
 
-        # Start the process with non-blocking I/O
-        process = subprocess.Popen(
-            cmd,
+        # Start the process; the event loop stays free to serve other tools
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
             cwd=project_dir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1,  # Line buffered
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            # Own session/process group so a timeout kill can reach any
+            # children the program spawned (POSIX only)
+            start_new_session=not _IS_WINDOWS,
         )
 
-        # Function to kill process and children
-        def kill_process_tree(pid):
-            try:
-                # Get the parent process
-                parent = psutil.Process(pid)
-                # Get all children recursively
-                children = parent.children(recursive=True)
-
-                # Kill children first
-                for child in children:
-                    try:
-                        child.kill()
-                    except:
-                        pass
-
-                # Kill the parent
-                parent.kill()
-
-                # Wait for processes to terminate
-                gone, still_alive = psutil.wait_procs(children + [parent], timeout=1)
-
-                # Force kill any remaining processes
-                for p in still_alive:
-                    try:
-                        p.kill()
-                    except:
-                        pass
-
-            except Exception as e:
-                output_lines.append(f"Error killing process tree: {str(e)}")
-                # Fallback: try direct kill
-                try:
-                    os.kill(pid, signal.SIGKILL if os.name != "nt" else signal.SIGTERM)
-                except:
-                    pass
-
-        start_time = time.time()
-        MAX_RUNTIME = 5  # Always exit after 5 seconds
-        stdout_lines = []
-        stderr_lines = []
-
-        # Non-blocking output reading
-        import select
-        import io
-
-        # Make sure stdout/stderr are non-blocking
-        if os.name != "nt":  # Unix-like
-            import fcntl
-
-            fcntl.fcntl(process.stdout.fileno(), fcntl.F_SETFL, os.O_NONBLOCK)
-            fcntl.fcntl(process.stderr.fileno(), fcntl.F_SETFL, os.O_NONBLOCK)
-
-        # For Windows, we'll use a polling approach
-        def read_nonblocking(stream):
-            try:
-                if os.name == "nt":  # Windows
-                    from msvcrt import get_osfhandle
-                    from win32pipe import PeekNamedPipe
-                    from win32file import ReadFile
-
-                    handle = get_osfhandle(stream.fileno())
-                    try:
-                        _, avail, _ = PeekNamedPipe(handle, 0)
-                        if avail > 0:
-                            return stream.readline()
-                    except:
-                        return ""
-                else:  # Unix
-                    return stream.readline()
-            except:
-                return ""
-            return ""
-
-        # Main execution loop
-        while True:
-            # Check if we've exceeded MAX_RUNTIME
-            elapsed = time.time() - start_time
-            if elapsed > MAX_RUNTIME:
-                output_lines.append(
-                    f"Reached maximum runtime of {MAX_RUNTIME} seconds, terminating..."
-                )
-                break
-
-            # Check if process has completed naturally
-            exit_code = process.poll()
-            if exit_code is not None:
-                output_lines.append(f"Process exited with code {exit_code}")
-                success = exit_code == 0
-                break
-
-            # Read any available output
-            if os.name == "nt":  # Windows
-                # Use polling on Windows
-                stdout_line = read_nonblocking(process.stdout)
-                if stdout_line:
-                    stdout_lines.append(stdout_line.rstrip())
-
-                stderr_line = read_nonblocking(process.stderr)
-                if stderr_line:
-                    stderr_lines.append(stderr_line.rstrip())
-            else:  # Unix
-                # Use select on Unix
-                rlist, _, _ = select.select(
-                    [process.stdout, process.stderr], [], [], 0.1
-                )
-                if process.stdout in rlist:
-                    stdout_line = process.stdout.readline()
-                    if stdout_line:
-                        stdout_lines.append(stdout_line.rstrip())
-
-                if process.stderr in rlist:
-                    stderr_line = process.stderr.readline()
-                    if stderr_line:
-                        stderr_lines.append(stderr_line.rstrip())
-
-            # Short sleep to avoid CPU spin
-            time.sleep(0.1)
-
-        # Forcibly terminate the process if it's still running
-        if process.poll() is None:
-            output_lines.append("Forcibly terminating process...")
-            try:
-                # Try the clean function first
-                kill_process_tree(process.pid)
-            except:
-                # Fall back to simpler methods
-                try:
-                    process.kill()
-                except:
-                    pass
-
-            # Wait a bit to ensure it's dead
-            time.sleep(0.5)
-
-            # Double-check it's dead
-            if process.poll() is None:
-                output_lines.append("Warning: Process may still be running!")
-
-        # Collect any remaining output
+        stdout_lines = deque(maxlen=MAX_OUTPUT_LINES)
+        stderr_lines = deque(maxlen=MAX_OUTPUT_LINES)
+        timed_out = False
+
+        # Let the loop's selector wake us on exit instead of polling per
+        # line: one drain task per pipe follows the output at pipe speed
+        # while we block once on process exit. asyncio watches the child
+        # through epoll/kqueue (pidfd-backed on modern Linux), so there is
+        # no wakeup floor between events. Both paths drain this way —
+        # a cancelled communicate() would throw away everything it had
+        # already read, losing all pre-timeout output
+        drain_tasks = asyncio.gather(
+            _stream_lines(process.stdout, stdout_lines),
+            _stream_lines(process.stderr, stderr_lines),
+        )
         try:
-            stdout, stderr = process.communicate(timeout=1)
-            if stdout:
-                stdout_lines.extend(stdout.splitlines())
-            if stderr:
-                stderr_lines.extend(stderr.splitlines())
-        except:
-            pass
+            await asyncio.wait_for(process.wait(), timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            timed_out = True
+
+        if timed_out:
+            emit(f"Reached maximum runtime of {timeout_seconds} seconds, terminating...\n")
+            kill_error = await _kill_process_tree(process.pid)
+            if kill_error:
+                emit(kill_error)
+                emit("\n")
+            # Consider a planned termination successful
+            success = True
+            emit(
+                f"Process ran and was terminated after {timeout_seconds} seconds as planned\n"
+            )
+        else:
+            exit_code = process.returncode
+            emit(f"Process exited with code {exit_code}\n")
+            success = exit_code == 0
+
+        # Usually the pipes hit EOF right away — after a kill the whole
+        # group is dead, after a normal exit the writer is gone. But a
+        # background child that inherited stdout/stderr keeps them open
+        # past its parent's exit, so the drain is bounded on both paths;
+        # we give up on the tail rather than stall until that child dies
+        try:
+            await asyncio.wait_for(drain_tasks, timeout=_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            emit("Warning: output pipes stayed open after process exit\n")
 
         # Add output to the response
         if stdout_lines:
-            output_lines.append("Standard Output:")
-            output_lines.extend(stdout_lines)
+            emit("Standard Output:\n")
+            emit("\n".join(stdout_lines))
+            emit("\n")
 
         if stderr_lines:
-            output_lines.append("Standard Error:")
-            output_lines.extend(stderr_lines)
-
-        # Consider the run successful if we completed normally or terminated as planned
-        if success is False:  # Only change if not already set
-            success = True
-            output_lines.append(
-                "Process ran and was terminated after 5 seconds as planned"
-            )
+            emit("Standard Error:\n")
+            emit("\n".join(stderr_lines))
+            emit("\n")
 
     except Exception as e:
-        output_lines.append(f"Unexpected error during execution: {str(e)}")
+        emit(f"Unexpected error during execution: {str(e)}\n")
         success = False
 
     finally:
         # Make absolutely sure the process is dead
-        if process and process.poll() is None:
+        if process and process.returncode is None:
             try:
                 # One last attempt to kill the process
                 process.kill()
             except:
                 pass
 
-    # Join all output lines into a single string
-    output_str = "\n".join(output_lines)
+    output_str = buf.getvalue().rstrip("\n")
     return output_str, success